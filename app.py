@@ -1,5 +1,4 @@
 import asyncio
-import base64
 import json
 import threading
 import time  # Added for sleep in audio stream
@@ -9,8 +8,26 @@ import numpy as np
 import pyaudio  # Updated import
 import streamlit as st
 
-from constants import HIDE_STREAMLIT_RUNNING_MAN_SCRIPT
-from utils import SimpleRealtime, StreamingAudioRecorder
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+from constants import (
+    APP_CSS,
+    HIDE_STREAMLIT_RUNNING_MAN_SCRIPT,
+    TRANSCRIPT_HTML_HEAD,
+    TRANSCRIPT_HTML_TAIL,
+    TRANSCRIPT_PLACEHOLDER_HTML,
+)
+from utils import (
+    HAS_RTMIXER,
+    PYAUDIO,
+    AudioRing,
+    RingBufferPlayer,
+    SimpleRealtime,
+    StreamingAudioRecorder,
+)
 
 # Define the system message
 SYSTEM_MESSAGE = (
@@ -22,8 +39,16 @@ SYSTEM_MESSAGE = (
 
 st.set_page_config(page_title="PreceptorAI Interpreter", layout="wide")
 
-audio_buffer = np.array([], dtype=np.int16)
-buffer_lock = threading.Lock()
+FRAMES_PER_BUFFER = 2000
+
+audio_ring = AudioRing()
+rt_player = None
+
+# Preallocated so the playback callbacks never allocate on the audio thread.
+# PyAudio copies any C-contiguous buffer it is given before the callback
+# runs again, so the scratch array is returned without tobytes().
+_silence_bytes = bytes(FRAMES_PER_BUFFER * 2)
+_playback_scratch = np.empty(FRAMES_PER_BUFFER, dtype=np.int16)
 
 # Initialize session state variables
 if "audio_stream_started" not in st.session_state:
@@ -37,51 +62,52 @@ if "recorder" not in st.session_state:
     st.session_state.recorder = StreamingAudioRecorder()
 if "recording" not in st.session_state:
     st.session_state.recording = False
+if "transcript_version" not in st.session_state:
+    st.session_state.transcript_version = -1
+    st.session_state.transcript_html = TRANSCRIPT_PLACEHOLDER_HTML
 
 
 def audio_buffer_cb(pcm_audio_chunk):
     """
     Callback function to fill the audio buffer.
     """
-    global audio_buffer
-    with buffer_lock:
-        audio_buffer = np.concatenate([audio_buffer, pcm_audio_chunk])
+    if rt_player is not None:
+        written = rt_player.write(pcm_audio_chunk)
+    else:
+        written = audio_ring.write(pcm_audio_chunk)
+    if written < len(pcm_audio_chunk):
+        print(
+            f"Playback buffer full, dropped {len(pcm_audio_chunk) - written} samples"
+        )
 
 
 # Callback function for real-time playback using PyAudio
 def sd_audio_cb(in_data, frame_count, time_info, status):
-    global audio_buffer
-    channels = 1
-    with buffer_lock:
-        if len(audio_buffer) >= frame_count:
-            data = audio_buffer[:frame_count].reshape(-1, channels).tobytes()
-            audio_buffer = audio_buffer[frame_count:]
-        else:
-            data = (np.zeros(frame_count * channels, dtype=np.int16)).tobytes()
+    filled = audio_ring.read_into(_playback_scratch)
+    data = _playback_scratch if filled else _silence_bytes
     return (data, pyaudio.paContinue)
 
 
 def start_audio_stream():
-    p = pyaudio.PyAudio()
+    global rt_player
+    if HAS_RTMIXER:
+        # rtmixer plays from its own C callback; there is no stream to babysit
+        rt_player = RingBufferPlayer(frames_per_buffer=FRAMES_PER_BUFFER)
+        rt_player.start()
+        return
 
     def py_audio_callback(in_data, frame_count, time_info, status):
-        global audio_buffer
-        channels = 1
-        with buffer_lock:
-            if len(audio_buffer) >= frame_count:
-                data = audio_buffer[:frame_count].reshape(-1, channels).tobytes()
-                audio_buffer = audio_buffer[frame_count:]
-            else:
-                data = (np.zeros(frame_count * channels, dtype=np.int16)).tobytes()
+        filled = audio_ring.read_into(_playback_scratch)
+        data = _playback_scratch if filled else _silence_bytes
         return (data, pyaudio.paContinue)
 
-    stream = p.open(
+    stream = PYAUDIO.open(
         format=pyaudio.paInt16,
         channels=1,
         rate=24000,
         output=True,
         stream_callback=py_audio_callback,
-        frames_per_buffer=2000,
+        frames_per_buffer=FRAMES_PER_BUFFER,
     )
 
     stream.start_stream()
@@ -94,7 +120,6 @@ def start_audio_stream():
     finally:
         stream.stop_stream()
         stream.close()
-        p.terminate()
 
 
 @st.cache_resource(show_spinner=False)
@@ -102,7 +127,12 @@ def create_loop():
     """
     Creates a globally cached event loop running in a separate thread.
     """
-    loop = asyncio.new_event_loop()
+    try:
+        import uvloop
+
+        loop = uvloop.new_event_loop()
+    except ImportError:
+        loop = asyncio.new_event_loop()
     thread = threading.Thread(target=loop.run_forever, daemon=True)
     thread.start()
     return loop, thread
@@ -163,16 +193,60 @@ def initialize_client():
 initialize_client()
 
 
+def send_input_audio(client, chunks):
+    """
+    Encode recorded frames and send them as one append event.
+    """
+    try:
+        client.send(
+            "input_audio_buffer.append",
+            {"audio": base64.b64encode(b"".join(chunks)).decode("ascii")},
+        )
+    except Exception as e:
+        print(f"Audio encode error: {e}")
+
+
+def pump_input_audio(recorder, client):
+    """
+    Drain recorded frames on the event loop and hand them to the codec thread.
+    """
+    # tobytes() copies each frame before its ring slot can be reused
+    chunks = []
+    chunk = recorder.get_audio_chunk()
+    while chunk is not None:
+        chunks.append(chunk.tobytes())
+        chunk = recorder.get_audio_chunk()
+    if chunks:
+        client.codec_pool.submit(send_input_audio, client, chunks)
+
+
+async def flush_input_audio(recorder, client):
+    pump_input_audio(recorder, client)
+
+
 def start_recording():
     if not st.session_state.recording:
         st.session_state.recording = True
-        st.session_state.recorder.start_recording()
+        recorder = st.session_state.recorder
+        client = st.session_state.client
+        loop = st.session_state.event_loop
+        # Recorded frames are pushed to the event loop in batches
+        recorder.on_audio = lambda: loop.call_soon_threadsafe(
+            pump_input_audio, recorder, client
+        )
+        recorder.start_recording()
 
 
 def stop_recording():
     if st.session_state.recording:
         st.session_state.recording = False
-        st.session_state.recorder.stop_recording()
+        recorder = st.session_state.recorder
+        recorder.stop_recording()
+        recorder.on_audio = None
+        # Drain the tail after any pumps already queued on the loop, then let
+        # the codec thread finish so the commit follows the last append.
+        run_async(flush_input_audio(recorder, st.session_state.client))
+        st.session_state.client.codec_pool.submit(lambda: None).result()
         st.session_state.client.send("input_audio_buffer.commit")
         # Include the system_message parameter here
         st.session_state.client.send(
@@ -180,7 +254,6 @@ def stop_recording():
         )
 
 
-@st.fragment(run_every=1)
 def audio_player():
     if not st.session_state.audio_stream_started:
         st.session_state.audio_stream_started = True
@@ -188,46 +261,34 @@ def audio_player():
         threading.Thread(target=start_audio_stream, daemon=True).start()
 
 
-@st.fragment(run_every=1)
-def audio_recorder():
-    if st.session_state.recording:
-        while not st.session_state.recorder.audio_queue.empty():
-            chunk = st.session_state.recorder.get_audio_chunk()
-            if chunk is not None:
-                st.session_state.client.send(
-                    "input_audio_buffer.append",
-                    {"audio": base64.b64encode(chunk).decode()},
-                )
-
-
-@st.fragment(run_every=1)
 def response_area():
     """
-    Fragment to display the transcribed text of the audio input.
+    Display the transcribed text of the audio input.
     """
-    transcript = st.session_state.client.transcript
+    # Only rebuild the transcript HTML when a delta has arrived since the last run
+    client = st.session_state.client
+    if st.session_state.transcript_version != client.transcript_version:
+        st.session_state.transcript_version = client.transcript_version
+        transcript = client.transcript
+        st.session_state.transcript_html = (
+            TRANSCRIPT_HTML_HEAD + transcript + TRANSCRIPT_HTML_TAIL
+            if transcript
+            else TRANSCRIPT_PLACEHOLDER_HTML
+        )
     st.markdown(
         "<h3>📝 Transcribed Text</h3>",
         unsafe_allow_html=True,
     )
-    if transcript:
-        st.write(
-            f"""
-            <div style="padding: 15px; background-color: #ecf0f1; border-radius: 10px; min-height: 150px;">
-                {transcript}
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-    else:
-        st.write(
-            """
-            <div style="padding: 15px; background-color: #ecf0f1; border-radius: 10px; color: #7f8c8d; min-height: 150px;">
-                The transcribed text will appear here after recording.
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
+    st.write(st.session_state.transcript_html, unsafe_allow_html=True)
+
+
+@st.fragment(run_every=1)
+def ui_tick():
+    """
+    Single periodic fragment driving the parts of the page that poll.
+    """
+    audio_player()
+    response_area()
 
 
 def st_app():
@@ -237,74 +298,7 @@ def st_app():
     st.markdown(HIDE_STREAMLIT_RUNNING_MAN_SCRIPT, unsafe_allow_html=True)
 
     # Custom CSS for modern styling
-    st.markdown(
-        """
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@400;600&display=swap');
-        body {
-            font-family: 'Montserrat', sans-serif;
-            background-color: #f5f5f5;
-        }
-        /* Header */
-        .main-header {
-            text-align: center;
-            font-size: 2.5em;
-            font-weight: 600;
-            margin-top: 20px;
-            color: #2c3e50;
-        }
-        .sub-header {
-            text-align: center;
-            font-size: 1.2em;
-            color: #7f8c8d;
-            margin-bottom: 30px;
-        }
-        /* Buttons */
-        .stButton>button {
-            width: 100%;
-            border-radius: 8px;
-            background-color: #3498db;
-            color: white;
-            border: none;
-            font-size: 1em;
-            font-weight: 600;
-            padding: 10px;
-            margin-top: 10px;
-        }
-        .stButton>button:disabled {
-            background-color: #95a5a6;
-            color: #ecf0f1;
-        }
-        .stButton>button:hover {
-            background-color: #2980b9;
-        }
-        /* Status Indicator */
-        .status-indicator {
-            text-align: center;
-            font-size: 1em;
-            margin-top: 20px;
-            color: #34495e;
-        }
-        /* Footer */
-        .footer {
-            text-align: center;
-            color: #bdc3c7;
-            font-size: 0.9em;
-            margin-top: 50px;
-            margin-bottom: 20px;
-        }
-        /* Progress Bar */
-        .stProgress > div > div > div > div {
-            background-color: #3498db;
-        }
-        /* Other */
-        .reportview-container .main footer {
-            visibility: hidden;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(APP_CSS, unsafe_allow_html=True)
 
     # Header Section
     st.markdown(
@@ -323,7 +317,7 @@ def st_app():
 
     with col1:
         # Display Transcribed Text
-        response_area()
+        ui_tick()
 
     with col2:
         st.subheader("Controls")
@@ -389,9 +383,6 @@ def st_app():
         unsafe_allow_html=True,
     )
 
-    audio_player()
-    audio_recorder()
-
 
 if __name__ == "__main__":
     st_app()
@@ -39,6 +39,81 @@ HIDE_STREAMLIT_RUNNING_MAN_SCRIPT = """
 </style>
 """
 
+APP_CSS = """
+<style>
+@import url('https://fonts.googleapis.com/css2?family=Montserrat:wght@400;600&display=swap');
+body {
+    font-family: 'Montserrat', sans-serif;
+    background-color: #f5f5f5;
+}
+/* Header */
+.main-header {
+    text-align: center;
+    font-size: 2.5em;
+    font-weight: 600;
+    margin-top: 20px;
+    color: #2c3e50;
+}
+.sub-header {
+    text-align: center;
+    font-size: 1.2em;
+    color: #7f8c8d;
+    margin-bottom: 30px;
+}
+/* Buttons */
+.stButton>button {
+    width: 100%;
+    border-radius: 8px;
+    background-color: #3498db;
+    color: white;
+    border: none;
+    font-size: 1em;
+    font-weight: 600;
+    padding: 10px;
+    margin-top: 10px;
+}
+.stButton>button:disabled {
+    background-color: #95a5a6;
+    color: #ecf0f1;
+}
+.stButton>button:hover {
+    background-color: #2980b9;
+}
+/* Status Indicator */
+.status-indicator {
+    text-align: center;
+    font-size: 1em;
+    margin-top: 20px;
+    color: #34495e;
+}
+/* Footer */
+.footer {
+    text-align: center;
+    color: #bdc3c7;
+    font-size: 0.9em;
+    margin-top: 50px;
+    margin-bottom: 20px;
+}
+/* Progress Bar */
+.stProgress > div > div > div > div {
+    background-color: #3498db;
+}
+/* Other */
+.reportview-container .main footer {
+    visibility: hidden;
+}
+</style>
+"""
+
+TRANSCRIPT_HTML_HEAD = '<div style="padding: 15px; background-color: #ecf0f1; border-radius: 10px; min-height: 150px;">'
+TRANSCRIPT_HTML_TAIL = "</div>"
+
+TRANSCRIPT_PLACEHOLDER_HTML = """
+<div style="padding: 15px; background-color: #ecf0f1; border-radius: 10px; color: #7f8c8d; min-height: 150px;">
+    The transcribed text will appear here after recording.
+</div>
+"""
+
 OAI_LOGO_URL = "https://raw.githubusercontent.com/openai/openai-realtime-console/refs/heads/main/public/openai-logomark.svg"
 
 EVENT_1_JSON = """
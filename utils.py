@@ -1,18 +1,61 @@
 import asyncio
-import base64
-import json
+import atexit
 import os
-import queue
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import numpy as np
+import orjson
 import pyaudio  # Updated import
 import tzlocal
 import websockets
 from dotenv import load_dotenv
 
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+try:
+    import rtmixer
+except ImportError:
+    rtmixer = None
+
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+HAS_RTMIXER = rtmixer is not None
+
+# Shared by every stream in the process, so PortAudio is initialised once and
+# only torn down at exit rather than by whichever recorder is collected first.
+PYAUDIO = pyaudio.PyAudio()
+# Recorder streams that are still open; closed before PortAudio is terminated
+_open_streams = set()
+
+
+def _close_stream(stream):
+    try:
+        _open_streams.remove(stream)
+    except KeyError:
+        return  # Already closed
+    stream.stop_stream()
+    stream.close()
+
+
+def _terminate_pyaudio():
+    for stream in list(_open_streams):
+        _close_stream(stream)
+    PYAUDIO.terminate()
+
+
+atexit.register(_terminate_pyaudio)
+
+# Event types carrying base64 audio, mapped to the key that holds it
+_LOGGED_AUDIO_KEYS = {
+    "response.audio.delta": "delta",
+    "input_audio_buffer.append": "audio",
+}
 
 
 class SimpleRealtime:
@@ -20,21 +63,43 @@ class SimpleRealtime:
         self.url = "wss://api.openai.com/v1/realtime"
         self.debug = debug
         self.event_loop = event_loop
-        self.logs = []
-        self.transcript = ""
+        self.logs = deque(maxlen=1000)
+        self._transcript_parts = []
+        self.transcript_version = 0
         self.ws = None
         self._message_handler_task = None
+        self._out_q = None
+        self._sender_task = None
         self.audio_buffer_cb = audio_buffer_cb
+        # Base64 work for this client runs here rather than on the event loop
+        # or Streamlit thread. A single worker keeps audio chunks in order in
+        # both directions, and a per-client pool keeps sessions independent.
+        self.codec_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="codec"
+        )
+
+    @property
+    def transcript(self):
+        # Joined on read so each delta is an O(1) append
+        return "".join(self._transcript_parts)
 
     def is_connected(self):
         return self.ws is not None and self.ws.open
 
     def log_event(self, event_type, event):
-        if self.debug:
-            local_timezone = tzlocal.get_localzone()
-            now = datetime.now(local_timezone).strftime("%H:%M:%S")
-            msg = json.dumps(event)
-            self.logs.append((now, event_type, msg))
+        if not self.debug:
+            return True
+
+        local_timezone = tzlocal.get_localzone()
+        now = datetime.now(local_timezone).strftime("%H:%M:%S")
+        # Keep the event itself instead of re-serialising it, with the
+        # base64 audio payloads replaced by their size.
+        key = _LOGGED_AUDIO_KEYS.get(event.get("type"))
+        if key is not None:
+            value = event.get(key)
+            if isinstance(value, str) and len(value) > 64:
+                event = {**event, key: f"<{len(value)}B>"}
+        self.logs.append((now, event_type, event))
 
         return True
 
@@ -47,41 +112,73 @@ class SimpleRealtime:
             "OpenAI-Beta": "realtime=v1",
         }
 
+        # Audio deltas are base64 PCM that barely deflates, so skip
+        # permessage-deflate and size the buffers for large deltas.
         self.ws = await websockets.connect(
-            f"{self.url}?model={model}", extra_headers=headers
+            f"{self.url}?model={model}",
+            extra_headers=headers,
+            compression=None,
+            max_size=2**23,
+            read_limit=2**20,
+            write_limit=2**20,
         )
 
         # Start the message handler in the same loop as the websocket
         self._message_handler_task = self.event_loop.create_task(
             self._message_handler()
         )
+        # Outbound events are queued from any thread and written by one task
+        self._out_q = asyncio.Queue()
+        self._sender_task = self.event_loop.create_task(self._sender())
 
         return True
 
     async def _message_handler(self):
+        # The task is only started once connect() has opened the socket
+        ws = self.ws
         try:
             while True:
-                if not self.ws:
-                    await asyncio.sleep(0.05)
-                    continue
-
                 try:
-                    message = await asyncio.wait_for(self.ws.recv(), timeout=0.05)
-                    data = json.loads(message)
-                    self.receive(data)
-                except asyncio.TimeoutError:
-                    continue
+                    message = await ws.recv()
                 except websockets.exceptions.ConnectionClosed:
                     break
+                self.receive(orjson.loads(message))
         except Exception as e:
             print(f"Message handler error: {e}")
             await self.disconnect()
 
+    async def _sender(self):
+        ws = self.ws
+        try:
+            while True:
+                batch = [await self._out_q.get()]
+                while not self._out_q.empty():
+                    batch.append(self._out_q.get_nowait())
+                # Sequential awaits keep events in order and only suspend
+                # when the transport's write buffer is above its limit.
+                for message in batch:
+                    await ws.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"Sender error: {e}")
+            # Close the socket so later send() calls fail instead of queueing
+            await self.disconnect()
+
     async def disconnect(self):
         if self.ws:
             await self.ws.close()
             self.ws = None
-        if self._message_handler_task:
+        # Either task may be the one calling disconnect(); it cannot await itself
+        current = asyncio.current_task()
+        if self._sender_task and self._sender_task is not current:
+            self._sender_task.cancel()
+            try:
+                await self._sender_task
+            except asyncio.CancelledError:
+                pass
+        self._sender_task = None
+        if self._message_handler_task and self._message_handler_task is not current:
             self._message_handler_task.cancel()
             try:
                 await self._message_handler_task
@@ -92,13 +189,19 @@ class SimpleRealtime:
 
     def handle_audio(self, event):
         if event.get("type") == "response.audio_transcript.delta":
-            self.transcript += event.get("delta")
+            self._transcript_parts.append(event.get("delta") or "")
+            self.transcript_version += 1
 
         if event.get("type") == "response.audio.delta" and self.audio_buffer_cb:
-            b64_audio_chunk = event.get("delta")
-            decoded_audio_chunk = base64.b64decode(b64_audio_chunk)
+            self.codec_pool.submit(self._play_audio_delta, event.get("delta"))
+
+    def _play_audio_delta(self, b64_audio_chunk):
+        try:
+            decoded_audio_chunk = base64.b64decode(b64_audio_chunk, validate=False)
             pcm_audio_chunk = np.frombuffer(decoded_audio_chunk, dtype=np.int16)
             self.audio_buffer_cb(pcm_audio_chunk)
+        except Exception as e:
+            print(f"Audio decode error: {e}")
 
     def receive(self, event):
         self.log_event("server", event)
@@ -118,7 +221,10 @@ class SimpleRealtime:
 
         self.log_event("client", event)
 
-        self.event_loop.create_task(self.ws.send(json.dumps(event)))
+        # Decode back to str so websockets still sends a text frame
+        self.event_loop.call_soon_threadsafe(
+            self._out_q.put_nowait, orjson.dumps(event).decode()
+        )
 
         return True
 
@@ -128,54 +234,221 @@ class StreamingAudioRecorder:
     Audio recorder using PyAudio.
     """
 
-    def __init__(self, sample_rate=24000, channels=1, frames_per_buffer=2000):
+    def __init__(
+        self,
+        sample_rate=24000,
+        channels=1,
+        frames_per_buffer=2000,
+        queue_size=64,
+        notify_frames=3,
+    ):
         self.sample_rate = sample_rate
         self.channels = channels
         self.frames_per_buffer = frames_per_buffer
-        self.audio_queue = queue.Queue()
+        # Single-producer/single-consumer ring of recorded frames: only the
+        # PortAudio callback advances _w and only the consumer advances _r,
+        # so neither side needs a lock.
+        self._ring = np.empty(
+            (queue_size, frames_per_buffer * channels), dtype=np.int16
+        )
+        self._w = 0
+        self._r = 0
+        # Called from the PortAudio thread once notify_frames frames are
+        # buffered. It is not called again until the consumer has drained the
+        # ring, so one wakeup covers a whole batch.
+        self.on_audio = None
+        self.notify_frames = notify_frames
+        self._notify_pending = False
         self.is_recording = False
-        self.p = pyaudio.PyAudio()
         self.stream = None
+        self._finalizer = None
 
     def callback(self, in_data, frame_count, time_info, status):
         """
         This will be called for each audio block
         that gets recorded.
         """
-        pcm_audio_chunk = np.frombuffer(in_data, dtype=np.int16)
-        self.audio_queue.put(pcm_audio_chunk)
+        # One slot is kept free so the frame last handed to the consumer is
+        # not overwritten while it is still being read; overflow is dropped.
+        if self._w - self._r < len(self._ring) - 1:
+            self._ring[self._w % len(self._ring)] = np.frombuffer(
+                in_data, dtype=np.int16
+            )
+            self._w += 1
+            on_audio = self.on_audio
+            if (
+                on_audio is not None
+                and not self._notify_pending
+                and self._w - self._r >= self.notify_frames
+            ):
+                self._notify_pending = True
+                on_audio()
         return (None, pyaudio.paContinue)
 
     def start_recording(self):
         if self.is_recording:
             return  # Already recording
 
-        self.stream = self.p.open(
+        self.stream = PYAUDIO.open(
             format=pyaudio.paInt16,
             channels=self.channels,
             rate=self.sample_rate,
             input=True,
             frames_per_buffer=self.frames_per_buffer,
-            stream_callback=self.callback,
+            stream_callback=_weak_callback(self),
         )
+        _open_streams.add(self.stream)
+        # Closes the stream if the recorder is collected while recording
+        self._finalizer = weakref.finalize(self, _close_stream, self.stream)
         self.stream.start_stream()
         self.is_recording = True
 
     def stop_recording(self):
         if self.is_recording and self.stream is not None:
-            self.stream.stop_stream()
-            self.stream.close()
+            self._finalizer.detach()
+            self._finalizer = None
+            _close_stream(self.stream)
             self.stream = None
             self.is_recording = False
 
     def get_audio_chunk(self):
-        try:
-            return self.audio_queue.get_nowait()
-        except queue.Empty:
+        """
+        Return the oldest recorded frame, or None if there is none.
+
+        The frame is a view into the ring and stays valid until the next call.
+        """
+        if self._r == self._w:
+            # Drained; let the callback notify again
+            self._notify_pending = False
             return None
+        chunk = self._ring[self._r % len(self._ring)]
+        self._r += 1
+        return chunk
 
-    def __del__(self):
-        if self.stream is not None:
-            self.stream.stop_stream()
-            self.stream.close()
-        self.p.terminate()
+
+def _weak_callback(recorder):
+    """
+    Wrap `recorder.callback` so the PortAudio stream does not keep the
+    recorder alive.
+    """
+    ref = weakref.ref(recorder)
+
+    def callback(in_data, frame_count, time_info, status):
+        recorder = ref()
+        if recorder is None:
+            return (None, pyaudio.paComplete)
+        return recorder.callback(in_data, frame_count, time_info, status)
+
+    return callback
+
+
+class AudioRing:
+    """
+    Fixed-size single-producer/single-consumer ring buffer of int16 samples.
+
+    The read and write indices grow monotonically and are masked on access,
+    so appending a chunk only copies that chunk instead of the whole buffer.
+    Each index has a single writer and is only advanced after the samples it
+    covers have been copied, so one producer thread and one consumer thread
+    can use the ring without a lock.
+    """
+
+    # Responses arrive much faster than real time, so the default holds about
+    # three minutes of 24 kHz audio (8 MiB, committed lazily by the OS).
+    def __init__(self, capacity=1 << 22):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.buf = np.empty(capacity, dtype=np.int16)
+        self.write_idx = 0
+        self.read_idx = 0
+
+    def __len__(self):
+        return self.write_idx - self.read_idx
+
+    def write(self, chunk):
+        """
+        Append as much of `chunk` as fits and return the number of samples written.
+        """
+        w_idx = self.write_idx
+        n = min(len(chunk), self.capacity - (w_idx - self.read_idx))
+        w = w_idx & self.mask
+        end = w + n
+        if end > self.capacity:
+            split = self.capacity - w
+            self.buf[w:] = chunk[:split]
+            self.buf[: end - self.capacity] = chunk[split:n]
+        else:
+            self.buf[w:end] = chunk[:n]
+        # Publish the samples to the consumer
+        self.write_idx = w_idx + n
+        return n
+
+    def read_into(self, out):
+        """
+        Pop `len(out)` samples into `out`, or return False if fewer are buffered.
+        """
+        n = len(out)
+        r_idx = self.read_idx
+        if self.write_idx - r_idx < n:
+            return False
+        r = r_idx & self.mask
+        end = r + n
+        if end > self.capacity:
+            split = self.capacity - r
+            np.copyto(out[:split], self.buf[r:])
+            np.copyto(out[split:], self.buf[: end - self.capacity])
+        else:
+            np.copyto(out, self.buf[r:end])
+        # Hand the slots back to the producer
+        self.read_idx = r_idx + n
+        return True
+
+
+class RingBufferPlayer:
+    """
+    Audio player using rtmixer, whose PortAudio callback is implemented in C.
+
+    Samples are handed over through a PortAudio ring buffer, so no Python code
+    runs (and the GIL is never taken) on the audio thread.
+    """
+
+    def __init__(
+        self, sample_rate=24000, channels=1, frames_per_buffer=2000, capacity=1 << 22
+    ):
+        if rtmixer is None:
+            raise RuntimeError("rtmixer is not installed")
+        self.channels = channels
+        self.mixer = rtmixer.Mixer(
+            channels=channels, samplerate=sample_rate, blocksize=frames_per_buffer
+        )
+        # rtmixer streams are always float32
+        self.ring = rtmixer.RingBuffer(elementsize=4 * channels, size=capacity)
+        self._action = None
+
+    def start(self):
+        self.mixer.start()
+
+    def write(self, pcm_audio_chunk):
+        """
+        Queue int16 samples for playback and return the number of frames written.
+        """
+        written, buf1, buf2 = self.ring.get_write_buffers(
+            len(pcm_audio_chunk) // self.channels
+        )
+        # Convert straight into the ring's memory rather than via a temporary
+        dst1 = np.frombuffer(buf1, dtype=np.float32)
+        dst2 = np.frombuffer(buf2, dtype=np.float32)
+        n1 = len(dst1)
+        scale = np.float32(1 / 32768)
+        np.multiply(pcm_audio_chunk[:n1], scale, out=dst1, casting="unsafe")
+        np.multiply(
+            pcm_audio_chunk[n1 : n1 + len(dst2)], scale, out=dst2, casting="unsafe"
+        )
+        self.ring.advance_write_index(written)
+        # A play_ringbuffer action finishes as soon as the ring runs dry,
+        # so re-arm it whenever new audio arrives after an underflow.
+        if self._action is None or self._action not in self.mixer.actions:
+            self._action = self.mixer.play_ringbuffer(self.ring)
+        return written